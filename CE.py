@@ -1,11 +1,33 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
 import gspread
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import AuthorizedSession, Request
 from google.oauth2.service_account import Credentials
 
+logger = logging.getLogger(__name__)
+
 # Page configuration
 st.set_page_config(
     page_title="Performance Dashboard",
@@ -13,69 +35,744 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize connection
-#@st.cache_resource
-def connect_to_google_sheets():
-    """Connect to Google Sheets using Streamlit secrets"""
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    # Drive modifiedTime, which the change probe compares
+    "https://www.googleapis.com/auth/drive.metadata.readonly"
+]
+SERVICE_ACCOUNT_KEYS = [
+    "type", "project_id", "private_key_id", "private_key", "client_email",
+    "client_id", "auth_uri", "token_uri", "auth_provider_x509_cert_url",
+    "client_x509_cert_url"
+]
+# Columns the dashboard reads, with their dtype, whether blanks are allowed
+# and what to fill blanks with. Everything else in the sheet is dropped at load.
+# Dimensions are categoricals with sorted categories, so filters and groupbys
+# work on integer codes.
+LOAN_SCHEMA = {
+    'AMOUNT IN USD': {'dtype': 'float64', 'nullable': True, 'fill': None},
+    'OUTSTANDING': {'dtype': 'float64', 'nullable': True, 'fill': None},
+    'INTEREST RATE': {'dtype': 'float64', 'nullable': True, 'fill': None},
+    'Date': {'dtype': 'datetime64[ns]', 'nullable': True, 'fill': None},
+    'VALUE DATE': {'dtype': 'datetime64[ns]', 'nullable': True, 'fill': None},
+    'MATUR_DATE': {'dtype': 'datetime64[ns]', 'nullable': True, 'fill': None},
+    'Quarter': {'dtype': 'category', 'nullable': False, 'fill': 'Unknown'},
+    'Branch/Outlet': {'dtype': 'category', 'nullable': False, 'fill': 'Unknown'},
+    'RM Name': {'dtype': 'category', 'nullable': False, 'fill': 'Unknown'},
+    'PRODUCT_TYPE': {'dtype': 'category', 'nullable': True, 'fill': None},
+}
+DATE_COLUMNS = [col for col, spec in LOAN_SCHEMA.items() if spec['dtype'].startswith('datetime')]
+NUMERIC_COLUMNS = [col for col, spec in LOAN_SCHEMA.items() if spec['dtype'] == 'float64']
+MONEY_COLUMNS = ['AMOUNT IN USD', 'OUTSTANDING']
+# Percent-formatted in the sheet: formatted values read "12.5%", unformatted
+# ones come back as the fraction 0.125
+PERCENT_COLUMNS = ['INTEREST RATE']
+# Dimensions of the LoanCube cells, and the slice() keyword for each
+CUBE_DIMENSIONS = ['Quarter', 'PRODUCT_TYPE', 'MONTH', 'Branch/Outlet', 'RM Name']
+CUBE_FILTERS = dict(zip(['quarter', 'product', 'month', 'branch', 'rm'], CUBE_DIMENSIONS))
+CUBE_MEASURES = ['loans', 'amount_sum', 'amount_count', 'outstanding_sum', 'rate_sum', 'rate_count']
+# clean_numeric_column removes the format characters first and falls back to
+# stripping anything but digits, '.' and '-' when that isn't enough
+NUMERIC_STRIP_PATTERN = r'[^\d.-]'
+NUMERIC_FORMAT_CHARS = ['$', ',', '%', ' ']
+# Candidate formats for date strings, month-first as pandas assumes by default
+DATE_FORMATS = [
+    '%m/%d/%Y', '%d/%m/%Y', '%Y-%m-%d', '%m/%d/%y', '%d/%m/%y', '%d-%b-%Y', '%d %b %Y',
+    '%b %d, %Y', '%d-%b-%y', '%m/%d/%Y %H:%M:%S', '%Y-%m-%d %H:%M:%S'
+]
+DATE_SAMPLE_SIZE = 200
+DATA_TTL = timedelta(hours=1)
+SNAPSHOT_META_KEY = b'loan_book'
+# Bump whenever prepare_data's output changes, so older snapshots are discarded
+PREPARE_VERSION = 1
+# Background reloads start this long before a version expires
+REFRESH_AHEAD = timedelta(minutes=5)
+REFRESH_RETRY_SECONDS = 60
+# Safety net full reload; the probe's modified time catches edits anywhere in
+# the sheet, except ones made while rows are being appended
+FULL_RESYNC_INTERVAL = timedelta(hours=24)
+# Rows just above the high-water mark that the change probe compares
+SENTINEL_ROWS = 5
+# Day zero of Google Sheets date serial numbers
+SHEETS_EPOCH = pd.Timestamp('1899-12-30')
+# Serials outside this range are before the epoch or don't fit in datetime64[ns]
+DATE_SERIAL_RANGE = (0, (pd.Timestamp.max.date() - SHEETS_EPOCH.date()).days - 1)
+# Refresh the OAuth token this long before Google says it expires
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+HTTP_POOL_SIZE = 10
+# Sheets API read quota is 60 requests per minute per user
+SHEETS_REQUESTS_PER_MINUTE = 60
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Memory budget for view aggregations shared across sessions
+AGGREGATE_CACHE_MB = 64
+# Sheets larger than this are fetched as parallel row blocks
+FETCH_BLOCK_ROWS = 50000
+FETCH_WORKERS = 4
+
+
+def get_setting(name, default):
+    """Optional dashboard setting from the [dashboard] section of secrets"""
     try:
-        # Get service account info from Streamlit secrets
-        service_account_info = {
-            "type": st.secrets["gcp"]["type"],
-            "project_id": st.secrets["gcp"]["project_id"],
-            "private_key_id": st.secrets["gcp"]["private_key_id"],
-            "private_key": st.secrets["gcp"]["private_key"],
-            "client_email": st.secrets["gcp"]["client_email"],
-            "client_id": st.secrets["gcp"]["client_id"],
-            "auth_uri": st.secrets["gcp"]["auth_uri"],
-            "token_uri": st.secrets["gcp"]["token_uri"],
-            "auth_provider_x509_cert_url": st.secrets["gcp"]["auth_provider_x509_cert_url"],
-            "client_x509_cert_url": st.secrets["gcp"]["client_x509_cert_url"]
-        }
-        
-        creds = Credentials.from_service_account_info(
-            service_account_info,
-            scopes=["https://www.googleapis.com/auth/spreadsheets"]
+        return st.secrets.get("dashboard", {}).get(name, default)
+    except Exception:
+        return default
+
+
+def get_service_account_info():
+    """Build the service account dict from Streamlit secrets"""
+    return {key: st.secrets["gcp"][key] for key in SERVICE_ACCOUNT_KEYS}
+
+
+def is_auth_error(error):
+    """True if an exception means our credentials were rejected"""
+    if isinstance(error, RefreshError):
+        return True
+    response = getattr(error, "response", None)
+    return isinstance(error, gspread.exceptions.APIError) and \
+        response is not None and response.status_code in (401, 403)
+
+
+class CircuitOpenError(Exception):
+    """Sheets has failed repeatedly and requests are paused"""
+
+
+class SheetsRequestScheduler:
+    """Per-minute quota, jittered retries and a circuit breaker for Sheets requests
+
+    request() takes any callable returning a response-like object with a
+    status_code, so it can be driven by a local fake server or a stub.
+    """
+
+    def __init__(self, per_minute=SHEETS_REQUESTS_PER_MINUTE, max_retries=5, base_delay=1.0,
+                 max_delay=32.0, failure_threshold=5, reset_timeout=60.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.per_minute = per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._sent = deque()
+        self._failures = 0
+        self._opened_at = None
+
+    @property
+    def is_open(self):
+        """True while requests are being refused"""
+        with self._lock:
+            return self._opened_at is not None and \
+                self._clock() - self._opened_at < self.reset_timeout
+
+    def _check_circuit(self):
+        if self.is_open:
+            raise CircuitOpenError(
+                f"Google Sheets paused after {self._failures} failed requests"
+            )
+        # Past the reset timeout the next request goes through as a trial
+
+    def _wait_for_quota(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                while self._sent and now - self._sent[0] >= 60:
+                    self._sent.popleft()
+                if len(self._sent) < self.per_minute:
+                    self._sent.append(now)
+                    return
+                wait = 60 - (now - self._sent[0])
+            self._sleep(wait)
+
+    def _backoff(self, attempt, response=None):
+        retry_after = getattr(response, 'headers', {}).get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        # Full jitter keeps parallel callers from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _record(self, ok):
+        with self._lock:
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+            else:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._opened_at = self._clock()
+
+    def request(self, send):
+        """Run send() under the quota, retrying 429/5xx and connection errors"""
+        self._check_circuit()
+        attempt = 0
+        while True:
+            self._wait_for_quota()
+            response = None
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    self._record(False)
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self._record(True)
+                    return response
+                if attempt >= self.max_retries:
+                    # Hand the last error response back so gspread raises its APIError
+                    self._record(False)
+                    return response
+            self._sleep(self._backoff(attempt, response))
+            attempt += 1
+
+
+class ScheduledSession(AuthorizedSession):
+    """AuthorizedSession that sends every request through the scheduler"""
+
+    def __init__(self, credentials, scheduler, **kwargs):
+        super().__init__(credentials, **kwargs)
+        self._scheduler = scheduler
+
+    def request(self, method, url, *args, **kwargs):
+        send = super().request
+        return self._scheduler.request(lambda: send(method, url, *args, **kwargs))
+
+
+class SheetsClientManager:
+    """Keep one authorized gspread client and pooled HTTP session per process"""
+
+    def __init__(self, service_account_info, scheduler, pool_size=HTTP_POOL_SIZE):
+        self._info = service_account_info
+        self._scheduler = scheduler
+        self._pool_size = pool_size
+        self._lock = threading.Lock()
+        self._creds = None
+        self._session = None
+        self._client = None
+
+    def _build(self):
+        creds = Credentials.from_service_account_info(self._info, scopes=SCOPES)
+        adapter = HTTPAdapter(pool_connections=self._pool_size, pool_maxsize=self._pool_size)
+        # Token requests get their own keep-alive session so refreshes skip the TLS handshake too
+        token_session = requests.Session()
+        token_session.mount("https://", adapter)
+        session = ScheduledSession(creds, self._scheduler, auth_request=Request(token_session))
+        session.mount("https://", adapter)
+        self._creds = creds
+        self._token_session = token_session
+        self._session = session
+        self._client = gspread.Client(auth=creds, session=session)
+
+    def _token_expiring(self):
+        if not self._creds.valid or self._creds.expiry is None:
+            return True
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return self._creds.expiry - TOKEN_REFRESH_MARGIN <= now
+
+    def get_client(self):
+        """Return the shared client, refreshing the token ahead of expiry"""
+        with self._lock:
+            if self._client is None:
+                self._build()
+            if self._token_expiring():
+                self._creds.refresh(Request(self._token_session))
+            return self._client
+
+    def invalidate(self):
+        """Drop the client so the next call re-authorizes from scratch"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._token_session.close()
+            self._creds = self._token_session = self._session = self._client = None
+
+    def call(self, fn):
+        """Run fn(client), rebuilding the client once if auth fails"""
+        try:
+            return fn(self.get_client())
+        except Exception as e:
+            if not is_auth_error(e):
+                raise
+            self.invalidate()
+            return fn(self.get_client())
+
+
+@st.cache_resource
+def get_request_scheduler():
+    """One request scheduler, and so one quota budget, per process"""
+    return SheetsRequestScheduler(
+        per_minute=get_setting("sheets_requests_per_minute", SHEETS_REQUESTS_PER_MINUTE)
+    )
+
+
+# Initialize connection
+@st.cache_resource
+def get_client_manager():
+    """One client manager shared by every session in this process"""
+    return SheetsClientManager(get_service_account_info(), get_request_scheduler())
+
+def schema_columns():
+    """Columns kept at load: the schema plus the loan id column, if configured"""
+    columns = list(LOAN_SCHEMA)
+    id_column = get_setting("loan_id_column", None)
+    if id_column and id_column not in columns:
+        columns.append(id_column)
+    return columns
+
+def project_columns(header, columns=None):
+    """Positions and names of the header columns worth loading, in sheet order"""
+    wanted = set(schema_columns() if columns is None else columns)
+    keep = [(i, name) for i, name in enumerate(header) if name in wanted]
+    names = [name for _, name in keep]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise gspread.exceptions.GSpreadException(
+            f"the header row in the worksheet contains duplicates: {duplicates}"
         )
-        client = gspread.authorize(creds)
-        return client
-    except Exception as e:
-        st.error(f"Connection failed: {e}")
-        return None
+    return [i for i, _ in keep], names
 
-# Load data
-@st.cache_data(ttl=3600)
-def load_data():
-    """Load data from Google Sheets"""
-    try:
-        client = connect_to_google_sheets()
-        if not client:
-            return None
-        
-        sheet_id = st.secrets["sheets"]["sheet_id"]
-        sheet = client.open_by_key(sheet_id)
-        #sheet = client.open_by_key("1wM7DTHizhg_A3h0qV3EhX4os4hk46uolW-ESQSJkgZs")
-        
-        # Load main data
-        worksheet = sheet.worksheet("Sheet2")
-        data = worksheet.get_all_records()
-        df = pd.DataFrame(data)
-        
-        # Data cleaning and preprocessing
-        if not df.empty:
-            # Convert amount columns to numeric
-            
-            # Convert date columns
-            date_columns = ['VALUE DATE', 'Date', 'MATUR_DATE']
-            for col in date_columns:
+def frame_from_values(values, columns=None):
+    """Build a typed DataFrame from a raw 2-D values block (header row first)
+
+    Only schema columns (or the given columns) are kept.
+    """
+    if not values:
+        return pd.DataFrame()
+    header = [str(name).strip() for name in values[0]]
+    positions, names = project_columns(header, columns)
+    
+    # The API drops trailing empty cells, so short rows are padded by pandas
+    df = pd.DataFrame(values[1:]).reindex(columns=positions)
+    df.columns = names
+    return tidy_raw_frame(df.fillna(''))
+
+def tidy_raw_frame(df):
+    """Drop blank rows and make the numeric schema columns and loan ids numeric when all-numeric"""
+    filled = df.notna() & (df != '')
+    
+    # Drop rows that are entirely blank
+    keep = filled.any(axis=1)
+    df = df[keep].reset_index(drop=True)
+    filled = filled[keep].reset_index(drop=True)
+    
+    # Columns whose non-blank cells are all plain numbers become numeric.
+    # Dimensions stay text, so branch codes like 001 keep their zeros.
+    numeric = NUMERIC_COLUMNS + [get_setting("loan_id_column", None)]
+    for col in df.columns:
+        if col not in numeric:
+            continue
+        if pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_datetime64_any_dtype(df[col]):
+            continue
+        # A small sample rules out text columns before parsing the whole column
+        sample = df[col][filled[col]].head(100)
+        if pd.to_numeric(sample, errors='coerce').isna().any():
+            continue
+        numbers = pd.to_numeric(df[col].where(filled[col]), errors='coerce')
+        if filled[col].any() and numbers.notna().sum() == filled[col].sum():
+            df[col] = numbers
+    return df
+
+def type_raw_frame(df, unformatted=False):
+    """Give the amount and date columns their types, whatever the source"""
+    if not df.empty:
+        # Amounts stay as read; clean_numeric_column handles mixed columns
+        if unformatted:
+            for col in PERCENT_COLUMNS:
                 if col in df.columns:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
+                    # Only cells that arrived as numbers are fractions; text
+                    # like "12.5%" is already in percent points
+                    is_number = number_cells(df[col])
+                    df[col] = df[col].where(~is_number, df[col][is_number] * 100)
         
-        return df
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
+        # Convert date columns
+        for col in DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = parse_date_column(df[col])
+    return df
+
+def number_cells(series):
+    """Mask of the cells holding plain numbers rather than text"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.notna()
+    return series.map(
+        lambda value: isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+    ).astype(bool)
+
+def detect_date_format(sample):
+    """Candidate format that parses the most sampled date strings, or None"""
+    best, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+        if count == len(sample):
+            return fmt
+        if count > best_count:
+            best, best_count = fmt, count
+    return best
+
+def parse_date_serials(series):
+    """Sheets date serials to datetime64; returns (dates, count out of range)"""
+    serials = pd.to_numeric(series, errors='coerce').astype('float64')
+    in_range = serials.between(*DATE_SERIAL_RANGE)
+    failed = int((serials.notna() & ~in_range).sum())
+    # One vectorized offset from the Sheets epoch instead of string parsing
+    return SHEETS_EPOCH + pd.to_timedelta(serials.where(in_range), unit='D'), failed
+
+def parse_date_text(series):
+    """Date strings to datetime64; returns (dates, count that didn't parse)"""
+    # A loan book has few distinct dates, so parse each one only once
+    codes, uniques = pd.factorize(series.astype(object).where(series != '', None))
+    uniques = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    fmt = detect_date_format(uniques.head(DATE_SAMPLE_SIZE))
+    if fmt is not None:
+        parsed = pd.to_datetime(uniques, format=fmt, errors='coerce')
+    else:
+        parsed = pd.to_datetime(uniques, errors='coerce')
+    dates = pd.api.extensions.take(parsed.values, codes, allow_fill=True)
+    return pd.Series(dates, index=series.index, name=series.name), int(parsed.isna().sum())
+
+def parse_date_column(series):
+    """Convert Sheets date serials or date strings to datetime64
+
+    Number cells are serials and text cells are parsed once per distinct
+    value, with a format detected from a sample; values that don't convert
+    are counted in the data quality report.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        dates, failed = parse_date_serials(series)
+    elif pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        dates, failed = parse_date_text(series)
+    else:
+        # Unformatted reads mix serials with dates typed in as text
+        is_number = number_cells(series)
+        dates, failed = parse_date_text(series.where(~is_number, ''))
+        serials, serial_failed = parse_date_serials(series[is_number])
+        dates[is_number] = serials
+        failed += serial_failed
+    record_data_quality(series.name, 'date', failed)
+    return dates.rename(series.name)
+
+def column_letter(index):
+    """A1 column letter for a 1-based column index"""
+    return gspread.utils.rowcol_to_a1(1, index).rstrip('0123456789')
+
+def open_worksheet(client):
+    """The loan book worksheet"""
+    return client.open_by_key(st.secrets["sheets"]["sheet_id"]).worksheet("Sheet2")
+
+def probe_worksheet(worksheet, row_count, header):
+    """Cheap look at a worksheet: grid size, header, rows around the high-water mark and modified time
+
+    worksheet only needs row_count, col_count, batch_get(ranges) and
+    spreadsheet.get_lastUpdateTime(), so a local fake can stand in for
+    gspread in tests.
+    """
+    last_col = column_letter(len(header))
+    first = max(2, row_count - SENTINEL_ROWS + 1)
+    known = row_count - first + 1
+    # One request covers the header and the sentinel rows plus the row after the mark
+    header_block, tail_block = worksheet.batch_get(
+        [f"A1:{last_col}1", f"A{first}:{last_col}{row_count + 1}"]
+    )
+    return {
+        'grid': [worksheet.row_count, worksheet.col_count],
+        'header': [str(name).strip() for name in (header_block[0] if header_block else [])],
+        'tail': [list(row) for row in tail_block[:known]],
+        'more': len(tail_block) > known,
+        # Drive's modifiedTime moves with an edit to any cell
+        'modified': worksheet.spreadsheet.get_lastUpdateTime()
+    }
+
+def probe_sheet(row_count, header):
+    """probe_worksheet() against the live Sheet2"""
+    return get_client_manager().call(
+        lambda client: probe_worksheet(open_worksheet(client), row_count, header)
+    )
+
+def fetch_values_in_blocks(worksheet, block_rows, workers, **get_kwargs):
+    """Fetch a worksheet's grid as concurrent row blocks, stitched back in order
+
+    Returns the values and a (range, rows, seconds) timing for each block.
+    """
+    last_col = column_letter(worksheet.col_count)
+    starts = list(range(1, worksheet.row_count + 1, block_rows))
+    
+    def fetch_block(start):
+        range_name = f"A{start}:{last_col}{start + block_rows - 1}"
+        began = time.perf_counter()
+        block = worksheet.get(range_name, **get_kwargs)
+        return range_name, block, time.perf_counter() - began
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, HTTP_POOL_SIZE))) as pool:
+        results = list(pool.map(fetch_block, starts))
+    
+    values, timings = [], []
+    for start, (range_name, block, seconds) in zip(starts, results):
+        timings.append((range_name, len(block), seconds))
+        if block:
+            # The API trims blank rows off each block; pad so rows keep their sheet position
+            values.extend([[]] * (start - 1 - len(values)))
+            values.extend(block)
+    return values, timings
+
+@st.cache_resource
+def get_fetch_log():
+    """Recent per-block fetch timings, kept across reruns"""
+    return deque(maxlen=50)
+
+def record_fetch_timings(timings):
+    fetched_at = datetime.now(timezone.utc)
+    log = get_fetch_log()
+    for range_name, rows, seconds in timings:
+        logger.info("Fetched %s (%d rows) in %.2fs", range_name, rows, seconds)
+        log.append({'fetched_at': fetched_at, 'range': range_name, 'rows': rows, 'seconds': round(seconds, 3)})
+
+@st.cache_resource
+def get_data_quality():
+    """Cells of the current book that failed to parse, per column, kept across reruns"""
+    return {}
+
+def reset_data_quality():
+    """Start counting afresh, before a full load is prepared"""
+    get_data_quality().clear()
+
+def record_data_quality(column, kind, failed):
+    """Add failures from one prepare; appended loads add to the full load's counts"""
+    if failed:
+        logger.warning("%d %s cells in %s could not be parsed", failed, kind, column)
+    quality = get_data_quality()
+    previous = quality.get(column, {}).get('failed', 0)
+    quality[column] = {'kind': kind, 'failed': previous + failed}
+
+# Load data
+def load_data(start_row=None, header=None):
+    """Load data from Google Sheets
+
+    Returns (df, row_count, header): df holds the schema columns, row_count
+    is the number of sheet rows read including the header, and header is the
+    sheet's full header row. Given start_row and header, only rows from
+    start_row down are fetched. Errors propagate to LoanBookCache, which logs
+    them and keeps the last one for the dashboard to show.
+    """
+    #sheet = client.open_by_key("1wM7DTHizhg_A3h0qV3EhX4os4hk46uolW-ESQSJkgZs")
+    # Unformatted mode returns amounts as numbers and dates as serials;
+    # type_raw_frame scales the percent columns, which arrive as fractions
+    unformatted = get_setting("unformatted_values", False)
+    range_name = None
+    if start_row is not None:
+        range_name = f"A{start_row}:{column_letter(len(header))}"
+    
+    get_kwargs = {}
+    if unformatted:
+        get_kwargs = {
+            'value_render_option': 'UNFORMATTED_VALUE',
+            'date_time_render_option': 'SERIAL_NUMBER'
+        }
+    block_rows = get_setting("fetch_block_rows", FETCH_BLOCK_ROWS)
+    
+    # Load main data
+    def fetch(client):
+        worksheet = open_worksheet(client)
+        if range_name is None and worksheet.row_count > block_rows:
+            # Big sheets come down as concurrent row blocks
+            values, timings = fetch_values_in_blocks(
+                worksheet, block_rows,
+                get_setting("fetch_workers", FETCH_WORKERS), **get_kwargs
+            )
+            record_fetch_timings(timings)
+            return values
+        # One raw values block instead of a dict per row
+        return worksheet.get(range_name, **get_kwargs)
+    
+    values = get_client_manager().call(fetch)
+    if start_row is None:
+        row_count = len(values)
+        header = [str(name).strip() for name in values[0]] if values else []
+    else:
+        row_count = start_row - 1 + len(values)
+        values = [header] + list(values)
+    df = type_raw_frame(frame_from_values(values), unformatted)
+    
+    return df, row_count, header
+
+
+class LoanBookSource(ABC):
+    """Where the raw loan book comes from
+
+    load(start_row=None, header=None) returns (df, row_count, header) the way
+    load_data does, and raises on failure. probe(row_count, header)
+    returns a probe_worksheet()-style dict, or None if the source can't probe.
+    """
+    name = "loan_book"
+
+    @abstractmethod
+    def load(self, start_row=None, header=None):
+        """Raw loan book as (df, row_count, header)"""
+
+    def probe(self, row_count, header):
         return None
 
 
+class SheetsSource(LoanBookSource):
+    """Sheet2 of the spreadsheet in Streamlit secrets"""
+
+    def load(self, start_row=None, header=None):
+        return load_data(start_row, header)
+
+    def probe(self, row_count, header):
+        return probe_sheet(row_count, header)
+
+
+class MemorySource(LoanBookSource):
+    """In-memory fake of Sheet2, holding a values block with the header row first
+
+    It also implements the worksheet interface probe_worksheet() needs, so
+    refresh, probe and incremental logic can be exercised without Google.
+    """
+    name = "memory"
+
+    def __init__(self, values):
+        self.values = [list(row) for row in values]
+
+    @property
+    def spreadsheet(self):
+        return self
+
+    def get_lastUpdateTime(self):
+        # A digest of the values changes with any edit, as Drive's modifiedTime does
+        return hashlib.sha1(json.dumps(self.values, default=str).encode()).hexdigest()
+
+    @property
+    def row_count(self):
+        return len(self.values)
+
+    @property
+    def col_count(self):
+        return len(self.values[0]) if self.values else 0
+
+    def get(self, range_name=None, **kwargs):
+        if range_name is None:
+            rows = [list(row) for row in self.values]
+        else:
+            grid = gspread.utils.a1_range_to_grid_range(range_name)
+            rows = [
+                row[grid.get('startColumnIndex', 0):grid.get('endColumnIndex')]
+                for row in self.values[grid.get('startRowIndex', 0):grid.get('endRowIndex')]
+            ]
+        # Like the API, drop trailing blank rows
+        while rows and not any(cell != '' for cell in rows[-1]):
+            rows.pop()
+        return rows
+
+    def batch_get(self, ranges, **kwargs):
+        return [self.get(range_name) for range_name in ranges]
+
+    def load(self, start_row=None, header=None):
+        if start_row is None:
+            values = self.get()
+            row_count = len(values)
+            header = [str(name).strip() for name in values[0]] if values else []
+        else:
+            values = self.get(f"A{start_row}:{column_letter(len(header))}")
+            row_count = start_row - 1 + len(values)
+            values = [header] + values
+        return type_raw_frame(frame_from_values(values)), row_count, header
+
+    def probe(self, row_count, header):
+        return probe_worksheet(self, row_count, header)
+
+
+class FileSource(LoanBookSource):
+    """Local file backend; any change to the file means a full reload"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @abstractmethod
+    def read_header(self):
+        """The file's column names"""
+
+    @abstractmethod
+    def read(self, columns):
+        """The named columns of the file as a DataFrame"""
+
+    def load(self, start_row=None, header=None):
+        """The whole file; start_row is ignored, as file changes always reload in full"""
+        header = list(self.read_header())
+        _, columns = project_columns([str(name).strip() for name in header])
+        raw_names = [name for name in header if str(name).strip() in columns]
+        df = self.read(raw_names)
+        df.columns = [str(name).strip() for name in df.columns]
+        df = type_raw_frame(tidy_raw_frame(df))
+        return df, len(df) + 1, [str(name).strip() for name in header]
+
+    def probe(self, row_count, header):
+        stat = self.path.stat()
+        # The file's size and mtime stand in for the rows already loaded
+        return {
+            'grid': [],
+            'header': list(header),
+            'tail': [[stat.st_size, stat.st_mtime_ns]],
+            'more': False
+        }
+
+
+class CsvSource(FileSource):
+    name = "csv"
+
+    def read_header(self):
+        return pd.read_csv(self.path, nrows=0).columns
+
+    def read(self, columns):
+        # Read as text like Sheets sends it; typing happens in tidy_raw_frame
+        return pd.read_csv(self.path, usecols=columns, dtype=str, keep_default_na=False)
+
+
+class ParquetSource(FileSource):
+    name = "parquet"
+
+    def read_header(self):
+        return pq.read_schema(self.path).names
+
+    def read(self, columns):
+        return pd.read_parquet(self.path, columns=columns)
+
+
+class SQLiteSource(FileSource):
+    name = "sqlite"
+
+    def __init__(self, path, table="loans"):
+        super().__init__(path)
+        self.table = table
+
+    def read_header(self):
+        with sqlite3.connect(self.path) as conn:
+            return [row[1] for row in conn.execute(f'PRAGMA table_info("{self.table}")')]
+
+    def read(self, columns):
+        select = ", ".join(f'"{name}"' for name in columns)
+        with sqlite3.connect(self.path) as conn:
+            return pd.read_sql_query(f'SELECT {select} FROM "{self.table}"', conn)
+
+
+def make_source():
+    """Loan book backend picked by the data_source setting"""
+    kind = get_setting("data_source", "sheets")
+    if kind == "sheets":
+        return SheetsSource()
+    path = get_setting("data_path", None)
+    if kind == "csv":
+        return CsvSource(path)
+    if kind == "parquet":
+        return ParquetSource(path)
+    if kind == "sqlite":
+        return SQLiteSource(path, get_setting("sqlite_table", "loans"))
+    raise ValueError(f"Unknown data_source: {kind}")
+
+
 # Mobile CSS
 st.markdown("""
 <style>
@@ -139,94 +836,862 @@ if 'selected_month' not in st.session_state:
     st.session_state.selected_month = None
 if 'selected_branch' not in st.session_state:
     st.session_state.selected_branch = None
+if 'runs_since_navigation' not in st.session_state:
+    st.session_state.runs_since_navigation = 0
+if 'view_runs_since_navigation' not in st.session_state:
+    st.session_state.view_runs_since_navigation = 0
+
+def parse_numeric_text(text):
+    """Parse amount strings with Arrow kernels; returns (float64 values, unparseable count)"""
+    arr = pa.array(text, type=pa.string(), from_pandas=True)
+    # Drop the usual formatting characters with cheap literal replaces
+    for char in NUMERIC_FORMAT_CHARS:
+        arr = pc.replace_substring(arr, char, '')
+    arr = pc.if_else(pc.equal(arr, ''), pa.scalar(None, pa.string()), arr)
+    filled = len(arr) - arr.null_count
+    try:
+        values = pc.cast(arr, pa.float64()).to_numpy(zero_copy_only=False)
+    except pa.ArrowInvalid:
+        # Something unusual in there: remove every non-numeric character and coerce
+        arr = pc.replace_substring_regex(arr, NUMERIC_STRIP_PATTERN, '')
+        values = pd.to_numeric(arr.to_numpy(zero_copy_only=False), errors='coerce')
+    values = values.astype('float64')
+    return values, filled - int((~pd.isna(values)).sum())
 
 def clean_numeric_column(series):
-    """Clean and convert numeric columns with mixed data types"""
-    if series.dtype == 'object':
-        # Remove currency symbols, commas, and other non-numeric characters
-        cleaned = series.astype(str).str.replace(r'[^\d.-]', '', regex=True)
-        # Convert to numeric, setting errors to NaN
-        return pd.to_numeric(cleaned, errors='coerce')
-    return series
+    """Clean and convert numeric columns with mixed data types
+
+    Numeric cells pass through as they are; only text cells are parsed, with
+    Arrow string kernels. Text that still isn't a number becomes NaN and is
+    counted in the data quality report.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        values, failed = parse_numeric_text(series)
+        numbers = pd.Series(values, index=series.index, name=series.name)
+    else:
+        is_text = series.map(lambda value: isinstance(value, str)).astype(bool)
+        numbers = pd.to_numeric(series.where(~is_text), errors='coerce').astype('float64')
+        values, failed = parse_numeric_text(series[is_text])
+        numbers[is_text] = values
+    record_data_quality(series.name, 'numeric', failed)
+    return numbers
+
+def money_in_cents(df):
+    """True when the money columns hold integer cents (the money_as_cents setting)"""
+    return pd.api.types.is_integer_dtype(df['AMOUNT IN USD'])
+
+def to_dollars(values, cents):
+    """Money for display: integer cents become dollars, float dollars pass through"""
+    if not cents:
+        return values
+    dollars = values / 100
+    if isinstance(dollars, (pd.Series, pd.DataFrame)):
+        return dollars.astype('float64').round(2)
+    return round(float(dollars), 2)
+
+def month_label(month):
+    """Display label for a monthly period, e.g. 'January 2024'"""
+    return month.strftime('%B %Y')
+
+def observed_categories(series):
+    """Sorted values of a categorical that actually occur, found from the codes"""
+    return series.cat.remove_unused_categories().cat.categories.tolist()
+
+def data_fingerprint(df):
+    """Content hash identifying one version of the loan book"""
+    digest = hashlib.sha256(str(list(df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+def prepare_signature():
+    """The code version and settings that decide what prepare_data produces"""
+    return {
+        'prepare_version': PREPARE_VERSION,
+        'money_as_cents': bool(get_setting("money_as_cents", False)),
+        'loan_id_column': get_setting("loan_id_column", None),
+    }
+
+def book_version(raw):
+    """Version of a prepared book: the raw content plus how it was prepared"""
+    digest = hashlib.sha256(json.dumps(prepare_signature(), sort_keys=True).encode())
+    digest.update(data_fingerprint(raw).encode())
+    return digest.hexdigest()[:16]
+
+def dimension_text(series):
+    """Dimension values as text with blanks missing; whole numbers lose their '.0'"""
+    # Blank cells come through as empty strings as well as NaN
+    blank = series.isna() | series.eq('')
+    if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        # Already text, as from the sheet: skip the per-cell conversion
+        return series.where(~blank, None)
+    if pd.api.types.is_float_dtype(series) and (series[~blank] % 1 == 0).all():
+        # File sources store numeric codes as floats once a column has blanks
+        series = series.astype('Int64')
+    return series.astype(object).astype(str).where(~blank, None)
+
+def apply_schema(df):
+    """Fill blanks and cast every schema column to its declared dtype in one pass"""
+    for col, spec in LOAN_SCHEMA.items():
+        if col not in df.columns:
+            # A missing column still exists downstream, just empty
+            df[col] = None
+        elif spec['dtype'] == 'float64':
+            df[col] = clean_numeric_column(df[col])
+        elif spec['dtype'] in ('string', 'category'):
+            df[col] = dimension_text(df[col])
+        if not spec['nullable']:
+            df[col] = df[col].fillna(spec['fill'])
+    dtypes = {col: spec['dtype'] for col, spec in LOAN_SCHEMA.items()}
+    if get_setting("money_as_cents", False):
+        # Exact integer cents; views convert to dollars only for display
+        for col in MONEY_COLUMNS:
+            df[col] = (df[col] * 100).round()
+            dtypes[col] = 'Int64'
+    return df.astype(dtypes)
+
+def prepare_data(df):
+    """Clean, type and derive every column the views need"""
+    df = apply_schema(df.copy())
+    
+    # Data preprocessing
+    # Monthly periods group and sort chronologically; labels are made per aggregated row
+    df['MONTH'] = df['Date'].dt.to_period('M')
+    return df
+
+def union_categories(frames):
+    """Copies of frames whose shared categoricals have the same sorted categories
+
+    concat only keeps a categorical (and its codes) when every side has
+    identical categories; otherwise the column falls back to object.
+    """
+    # Shallow copies: copy-on-write keeps the callers' frames unchanged
+    frames = [frame.copy(deep=False) for frame in frames]
+    first = frames[0]
+    for col in first.columns:
+        if not isinstance(first[col].dtype, pd.CategoricalDtype):
+            continue
+        others = [frame[col].astype('category') for frame in frames[1:] if col in frame.columns]
+        categories = first[col].cat.categories
+        for other in others:
+            categories = categories.union(other.cat.categories)
+        dtype = pd.CategoricalDtype(categories)
+        for frame in frames:
+            if col in frame.columns and frame[col].dtype != dtype:
+                frame[col] = frame[col].astype(dtype)
+    return frames
+
+def merge_loans(frame, delta, id_column=None):
+    """Append prepared rows, replacing existing loans with the same id
+
+    Returns the merged frame, the delta rows that went in and the existing
+    rows they replaced, which is what LoanCube.apply_delta() takes.
+    """
+    replaced = frame.iloc[:0]
+    if id_column and id_column in frame.columns:
+        delta = delta.drop_duplicates(id_column, keep='last')
+        is_replaced = frame[id_column].isin(delta[id_column])
+        replaced = frame[is_replaced]
+        frame = frame[~is_replaced]
+    frame, delta = union_categories([frame, delta])
+    return pd.concat([frame, delta], ignore_index=True), delta, replaced
+
+
+def classify_change(current, state):
+    """Compare a fresh probe with the one taken at the last load
+
+    'unchanged' skips the fetch, 'appended' fetches rows below the high-water
+    mark and 'edited' needs a full load: the header or the SENTINEL_ROWS rows
+    just above the mark changed, or the sheet was modified without rows
+    being added. An edit further up made alongside an append only shows at
+    the periodic full resync.
+    """
+    if state is None or current.probe is None:
+        return 'appended'
+    if state['header'] != current.header or state['tail'] != current.probe['tail']:
+        return 'edited'
+    if state.get('modified') != current.probe.get('modified') and not state['more']:
+        return 'edited'
+    if state == current.probe:
+        return 'unchanged'
+    return 'appended'
+
+
+class LoanCube:
+    """Additive loan measures at the finest Quarter x product x month x branch x RM grain
+
+    Views slice and roll up these cells instead of grouping loan rows, so
+    their cost follows the number of cells, not the number of loans. Each
+    cell belongs to exactly one RM and branch, so distinct counts are the
+    distinct keys among the cells a rollup covers.
+    """
+
+    def __init__(self, cells, cents=False):
+        self.cells = cells
+        self.cents = cents
+        # Dimension -> {value: sorted cell positions}, built on first filter
+        self._index = {}
+        self._keys = None
+        # Filter combination -> sliced cube; each combination of filter keys
+        # partitions the cells, so this holds at most a few copies of them
+        self._slices = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        """Aggregate prepared loan rows into cells, keeping blank products and dates"""
+        measures = pd.DataFrame({
+            **{col: df[col] for col in CUBE_DIMENSIONS},
+            'loans': 1,
+            'amount_sum': df['AMOUNT IN USD'],
+            'amount_count': df['AMOUNT IN USD'].notna().astype('int64'),
+            'outstanding_sum': df['OUTSTANDING'],
+            'rate_sum': df['INTEREST RATE'],
+            'rate_count': df['INTEREST RATE'].notna().astype('int64'),
+        }, index=df.index)
+        # Grouping by column names; Series keys make pandas format each one
+        cells = measures.groupby(CUBE_DIMENSIONS, observed=True, dropna=False).sum().reset_index()
+        return cls(cells, money_in_cents(df))
+
+    def apply_delta(self, inserted=None, removed=None):
+        """Cube with inserted loans added and removed loans taken out
+
+        An updated loan is its old row removed plus its new row inserted. The
+        delta's cells are added into copies of the measures, so the cost
+        follows the delta; cells left without loans are dropped.
+        """
+        parts = []
+        if inserted is not None and not inserted.empty:
+            parts.append(LoanCube.from_frame(inserted).cells)
+        if removed is not None and not removed.empty:
+            negated = LoanCube.from_frame(removed).cells
+            negated[CUBE_MEASURES] = -negated[CUBE_MEASURES]
+            parts.append(negated)
+        if not parts:
+            return self
+        delta = parts[0]
+        if len(parts) > 1:
+            delta = pd.concat(union_categories(parts), ignore_index=True)
+            delta = delta.groupby(CUBE_DIMENSIONS, observed=True, dropna=False)[CUBE_MEASURES].sum().reset_index()
+        
+        found = self.keys().get_indexer(pd.MultiIndex.from_frame(delta[CUBE_DIMENSIONS]))
+        matched = found >= 0
+        measures = {}
+        for col in CUBE_MEASURES:
+            values = self.cells[col].to_numpy(copy=True)
+            # Delta keys are unique, so each existing cell is added to at most once
+            values[found[matched]] += delta[col].to_numpy()[matched]
+            measures[col] = values
+        cells = self.cells.assign(**measures)
+        if not matched.all():
+            cells = pd.concat(union_categories([cells, delta[~matched]]), ignore_index=True)
+        if (cells['loans'] <= 0).any():
+            cells = cells[cells['loans'] > 0].reset_index(drop=True)
+        return LoanCube(cells, self.cents)
+
+    def keys(self):
+        """The cells' dimension values as a MultiIndex, built on first use"""
+        if self._keys is None:
+            self._keys = pd.MultiIndex.from_frame(self.cells[CUBE_DIMENSIONS])
+        return self._keys
+
+    def positions(self, column, value):
+        """Sorted positions of the cells where column equals value"""
+        if column not in self._index:
+            self._index[column] = self.cells.groupby(column, observed=True, sort=False).indices
+        return self._index[column].get(value, np.empty(0, dtype=np.intp))
+
+    def slice(self, **filters):
+        """Cells matching every given dimension value; None leaves a dimension open
+
+        The posting lists of the filtered values are intersected and the cells
+        gathered once, and each filter combination is only sliced once.
+        """
+        key = tuple(sorted((name, value) for name, value in filters.items() if value is not None))
+        if not key:
+            return self
+        cube = self._slices.get(key)
+        if cube is None:
+            lists = sorted((self.positions(CUBE_FILTERS[name], value) for name, value in key), key=len)
+            positions = lists[0]
+            for other in lists[1:]:
+                positions = np.intersect1d(positions, other, assume_unique=True)
+            cube = self._slices[key] = LoanCube(self.cells.take(positions), self.cents)
+        return cube
+
+    def totals(self):
+        """Loans, money sums and distinct branches and RMs across the slice"""
+        cells = self.cells
+        amount, count = cells['amount_sum'].sum(), cells['amount_count'].sum()
+        return {
+            'loans': int(cells['loans'].sum()),
+            'amount': to_dollars(amount, self.cents),
+            'outstanding': to_dollars(cells['outstanding_sum'].sum(), self.cents),
+            'avg_amount': to_dollars(amount / count, self.cents) if count else float('nan'),
+            'branches': cells['Branch/Outlet'].nunique(),
+            'rms': cells['RM Name'].nunique(),
+        }
+
+    def rollup(self, by):
+        """Measures summed per value of one dimension, with averages and distinct RMs"""
+        groups = self.cells.groupby(by, observed=True)
+        grouped = groups[CUBE_MEASURES].sum().rename(columns={
+            'amount_sum': 'amount', 'amount_count': 'count', 'outstanding_sum': 'outstanding'
+        })
+        grouped['rms'] = groups['RM Name'].nunique()
+        grouped['avg_amount'] = grouped['amount'].astype('float64') / grouped['count'].replace(0, float('nan'))
+        grouped['avg_rate'] = grouped['rate_sum'] / grouped['rate_count'].replace(0, float('nan'))
+        money = ['amount', 'outstanding', 'avg_amount']
+        grouped[money] = to_dollars(grouped[money].astype('float64'), self.cents)
+        return grouped
+
+    def top_products(self):
+        """Most frequent product per RM, ties going to the first product in sort order"""
+        counts = self.cells.groupby(['RM Name', 'PRODUCT_TYPE'], observed=True)['loans'].sum()
+        # idxmax takes the first of equal counts, and the columns are sorted
+        return counts.unstack(fill_value=0).idxmax(axis=1)
+
+
+class Dataset:
+    """One prepared version of the loan book
+
+    row_count and header are the sheet high-water mark for incremental loads;
+    synced_at is when the book was last loaded in full, and probe is the
+    probe_worksheet() result taken right after the load. cube is built from
+    the frame unless an unchanged version hands over its existing one.
+    prepared_with is the prepare_signature() the frame was prepared under.
+    """
+
+    def __init__(self, frame, version, fetched_at, row_count=None, header=None, synced_at=None,
+                 probe=None, cube=None, prepared_with=None):
+        self.frame = frame
+        self.prepared_with = prepared_with or prepare_signature()
+        self.cube = cube if cube is not None else LoanCube.from_frame(frame)
+        self.version = version
+        self.fetched_at = fetched_at
+        self.row_count = row_count
+        self.header = header
+        self.synced_at = synced_at or fetched_at
+        self.probe = probe
+
+    @property
+    def is_current(self):
+        """False once the code or settings would prepare the book differently"""
+        return self.prepared_with == prepare_signature()
+
+
+class SnapshotStore:
+    """Parquet snapshot of the prepared loan book, with fingerprint and fetch time"""
+
+    def __init__(self, directory, name="loan_book"):
+        self.path = Path(directory) / f"{name}.parquet"
+
+    def read(self):
+        """Last snapshot written, or None if there isn't a readable, current one"""
+        try:
+            table = pq.read_table(self.path)
+            meta = json.loads(table.schema.metadata[SNAPSHOT_META_KEY])
+        except Exception:
+            return None
+        if meta.get('prepared_with') != prepare_signature():
+            # Prepared by other code or settings; its columns can't be trusted
+            logger.info("Discarding snapshot %s prepared with %s", self.path, meta.get('prepared_with'))
+            return None
+        return Dataset(
+            table.to_pandas(),
+            meta['version'],
+            datetime.fromisoformat(meta['fetched_at']),
+            row_count=meta.get('row_count'),
+            header=meta.get('header'),
+            synced_at=datetime.fromisoformat(meta.get('synced_at', meta['fetched_at'])),
+            probe=meta.get('probe'),
+            prepared_with=meta['prepared_with']
+        )
+
+    def write(self, dataset):
+        """Write the snapshot atomically so readers never see a partial file"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(dataset.frame, preserve_index=False)
+        meta = json.dumps({
+            'version': dataset.version,
+            'fetched_at': dataset.fetched_at.isoformat(),
+            'row_count': dataset.row_count,
+            'header': dataset.header,
+            'synced_at': dataset.synced_at.isoformat(),
+            'probe': dataset.probe,
+            'prepared_with': dataset.prepared_with
+        })
+        table = table.replace_schema_metadata(
+            {**(table.schema.metadata or {}), SNAPSHOT_META_KEY: meta.encode()}
+        )
+        tmp_path = self.path.with_suffix('.parquet.tmp')
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, self.path)
+
+
+class LoanBookCache:
+    """Current prepared loan book, refreshed in the background (stale-while-revalidate)
+
+    Readers always get the last good version. Reloads run on a background
+    thread ahead of expiry, and concurrent misses share one in-flight fetch.
+    """
+
+    def __init__(self, source, snapshot, ttl=DATA_TTL, full_resync=FULL_RESYNC_INTERVAL,
+                 id_column=None):
+        self._source = source
+        self._snapshot = snapshot
+        self._ttl = ttl
+        self._full_resync = full_resync
+        self._id_column = id_column
+        self._lock = threading.Lock()
+        self._dataset = None
+        self._inflight = None
+        self._stop = threading.Event()
+        # Exception from the latest refresh, or None once one succeeds
+        self.last_error = None
+        # When the latest refresh started, and when one last failed
+        self.last_attempt_at = None
+        self.last_failure_at = None
+
+    def _fetch(self):
+        """Pull the source, prepare it if it changed and persist the snapshot"""
+        current = self._dataset
+        now = datetime.now(timezone.utc)
+        # Scheduled refreshes run REFRESH_AHEAD early, so the resync is due by then,
+        # and a book prepared under other code or settings is prepared again
+        if current is None or current.row_count is None or not current.is_current or \
+                now - current.synced_at >= self._full_resync - REFRESH_AHEAD:
+            dataset = self._fetch_full(current, now)
+        else:
+            state = self._probe_state(current.row_count, current.header)
+            change = classify_change(current, state)
+            if change == 'unchanged':
+                # Nothing moved: keep the book, just note that we checked
+                dataset = Dataset(
+                    current.frame, current.version, now, current.row_count, current.header,
+                    synced_at=current.synced_at, probe=state, cube=current.cube
+                )
+            elif change == 'edited':
+                dataset = self._fetch_full(current, now)
+            else:
+                dataset = self._fetch_appended(current, now)
+        if dataset is None:
+            return None
+        if dataset.probe is None:
+            dataset.probe = self._probe_state(dataset.row_count, dataset.header)
+        if current is None or dataset.version != current.version or \
+                dataset.synced_at != current.synced_at:
+            try:
+                self._snapshot.write(dataset)
+            except Exception:
+                # A failed snapshot only costs us the next cold start
+                logger.exception("Writing the loan book snapshot to %s failed", self._snapshot.path)
+        # Swap in the new version; readers hold on to whichever one they got
+        with self._lock:
+            self._dataset = dataset
+        return dataset
+
+    def _probe_state(self, row_count, header):
+        if row_count is None:
+            return None
+        try:
+            return self._source.probe(row_count, header)
+        except Exception:
+            # No probe result just means we fetch instead of skipping
+            return None
+
+    def _fetch_full(self, current, now):
+        # Parse failures are counted per book: a full load starts the count over,
+        # and puts the old one back if it ends up keeping the current frame
+        quality = dict(get_data_quality())
+        reset_data_quality()
+        try:
+            raw, row_count, header = self._source.load()
+            if raw is None or raw.empty:
+                # Counted as a failed refresh, so the current book and its error stay
+                raise ValueError(f"The {self._source.name} source returned no loan rows")
+            version = book_version(raw)
+            if current is not None and current.version == version:
+                # Unchanged book: keep the prepared frame and cube, only the fetch time moves
+                reset_data_quality()
+                get_data_quality().update(quality)
+                return Dataset(current.frame, version, now, row_count, header, cube=current.cube)
+            return Dataset(prepare_data(raw), version, now, row_count, header)
+        except Exception:
+            # The current book is still served, so keep reporting its counts
+            reset_data_quality()
+            get_data_quality().update(quality)
+            raise
+
+    def _fetch_appended(self, current, now):
+        """Fetch only rows below the high-water mark and merge them in"""
+        raw, row_count, _ = self._source.load(start_row=current.row_count + 1, header=current.header)
+        if raw is None:
+            return None
+        if raw.empty:
+            return Dataset(
+                current.frame, current.version, now, max(row_count, current.row_count),
+                current.header, synced_at=current.synced_at, cube=current.cube
+            )
+        frame, inserted, replaced = merge_loans(current.frame, prepare_data(raw), self._id_column)
+        version = hashlib.sha256(
+            (current.version + data_fingerprint(raw)).encode()
+        ).hexdigest()[:16]
+        return Dataset(
+            frame, version, now, max(row_count, current.row_count), current.header,
+            synced_at=current.synced_at, cube=current.cube.apply_delta(inserted, replaced)
+        )
+
+    def _run_refresh(self, future):
+        try:
+            dataset = self._fetch()
+        except Exception as e:
+            logger.exception("Loan book refresh failed")
+            self.last_error = e
+            self.last_failure_at = datetime.now(timezone.utc)
+            future.set_exception(e)
+        else:
+            self.last_error = None
+            future.set_result(dataset)
+        finally:
+            with self._lock:
+                self._inflight = None
+
+    def refresh(self):
+        """Start a reload unless one is already running; returns its future"""
+        with self._lock:
+            if self._inflight is None:
+                self.last_attempt_at = datetime.now(timezone.utc)
+                self._inflight = Future()
+                threading.Thread(
+                    target=self._run_refresh, args=(self._inflight,),
+                    name="loan-book-refresh", daemon=True
+                ).start()
+            return self._inflight
+
+    def _seconds_until_due(self):
+        dataset = self._dataset
+        if dataset is None:
+            return REFRESH_RETRY_SECONDS
+        due = dataset.fetched_at + self._ttl - REFRESH_AHEAD
+        wait = (due - datetime.now(timezone.utc)).total_seconds()
+        # After a failed reload the book stays overdue, so don't spin
+        return max(wait, REFRESH_RETRY_SECONDS)
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self._seconds_until_due()):
+            try:
+                self.refresh().result()
+            except Exception:
+                # _run_refresh has logged it and kept it in last_error
+                pass
+
+    def start(self):
+        """Begin scheduled refreshes just ahead of each version's expiry"""
+        threading.Thread(target=self._refresh_loop, name="loan-book-scheduler", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _retry_due(self):
+        """False for REFRESH_RETRY_SECONDS after a failed refresh, so reads don't hammer the source"""
+        if self.last_failure_at is None:
+            return True
+        since = datetime.now(timezone.utc) - max(self.last_failure_at, self.last_attempt_at)
+        return since.total_seconds() >= REFRESH_RETRY_SECONDS
+
+    def get(self):
+        """Prepared dataset to render; callers must not mutate its frame"""
+        with self._lock:
+            dataset = self._dataset
+            if dataset is None:
+                dataset = self._snapshot.read()
+                if dataset is not None:
+                    self._dataset = dataset
+        if dataset is None:
+            if not self._retry_due():
+                return None
+            # Nothing to serve yet: every session waits on the same fetch
+            try:
+                return self.refresh().result()
+            except Exception:
+                return None
+        stale = datetime.now(timezone.utc) - dataset.fetched_at > self._ttl - REFRESH_AHEAD
+        if (stale or not dataset.is_current) and self._retry_due():
+            # Serve what we have and revalidate behind it
+            self.refresh()
+        return dataset
+
+
+@st.cache_resource
+def get_loan_book():
+    """Loan book cache shared by every session in this process"""
+    source = make_source()
+    snapshot = SnapshotStore(get_setting("snapshot_dir", ".snapshots"), source.name)
+    full_resync = get_setting("full_resync_hours", None)
+    full_resync = FULL_RESYNC_INTERVAL if full_resync is None else timedelta(hours=full_resync)
+    return LoanBookCache(
+        source, snapshot, full_resync=full_resync,
+        id_column=get_setting("loan_id_column", None)
+    ).start()
+
+class AggregateCache:
+    """LRU memo of view aggregations, bounded by the bytes of the cached frames"""
+
+    def __init__(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        """Cached value for key, or compute(), cache and return it"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        value = compute()
+        size = int(value.memory_usage(deep=True).sum())
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, size)
+                self._bytes += size
+            # Keep the newest entry even if it alone is over budget
+            while self._bytes > self._max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries), 'MB': round(self._bytes / 1e6, 2),
+                'hits': self.hits, 'misses': self.misses
+            }
+
+
+@st.cache_resource
+def get_aggregate_cache():
+    """Aggregation memo shared by every session in this process"""
+    return AggregateCache(get_setting("aggregate_cache_mb", AGGREGATE_CACHE_MB) * 1_000_000)
+
+def monthly_summary(cube):
+    """Amount, loan count, outstanding and distinct RMs per month"""
+    monthly_data = cube.rollup('MONTH')[['amount', 'count', 'outstanding', 'rms']].round(2)
+    monthly_data.columns = ['Total Amount', 'Loan Count', 'Total Outstanding', 'Unique RMs']
+    monthly_data = monthly_data.reset_index()
+    monthly_data['Month'] = monthly_data['MONTH'].dt.strftime('%B %Y')
+    return monthly_data
+
+def product_summary(cube):
+    """Loan amount per product type"""
+    product_data = cube.rollup('PRODUCT_TYPE')[['amount']].reset_index()
+    product_data.columns = ['PRODUCT_TYPE', 'AMOUNT IN USD']
+    return product_data
+
+def branch_summary(cube):
+    """Amount, loan count, outstanding, RM count and average rate per branch"""
+    branch_data = cube.rollup('Branch/Outlet')[
+        ['amount', 'count', 'outstanding', 'rms', 'avg_rate']
+    ].round(2)
+    branch_data.columns = ['Total Amount', 'Loan Count', 'Total Outstanding', 'RM Count', 'Avg Interest Rate']
+    return branch_data.reset_index()
+
+def rm_summary(cube):
+    """Amounts, loan size, outstanding, average rate and top product per RM"""
+    rm_data = cube.rollup('RM Name')[
+        ['amount', 'count', 'avg_amount', 'outstanding', 'avg_rate']
+    ].round(2)
+    rm_data['Top Product'] = cube.top_products().reindex(rm_data.index).astype(object).fillna('N/A')
+    rm_data.columns = ['Total Amount', 'Loan Count', 'Avg Loan Size', 'Total Outstanding', 'Avg Interest Rate', 'Top Product']
+    return rm_data.reset_index()
+
+VIEW_AGGREGATES = {
+    'monthly': monthly_summary,
+    'product': product_summary,
+    'branch': branch_summary,
+    'rm': rm_summary,
+}
+
+def view_aggregate(name, dataset, filters, month=None, branch=None):
+    """One view aggregation for a drill path, memoized per data version
+
+    Callers share the returned frame with other sessions and must not mutate it.
+    """
+    key = (dataset.version, name, filters['quarter'], filters['product'], month, branch)
+    return get_aggregate_cache().get_or_compute(
+        key, lambda: VIEW_AGGREGATES[name](dataset.cube.slice(**filters, month=month, branch=branch))
+    )
+
+def show_data_debug(df):
+    """Column dtypes and null counts, shown when the debug setting is on"""
+    with st.sidebar.expander("🔧 Data debug"):
+        st.dataframe(
+            pd.DataFrame({'dtype': df.dtypes.astype(str), 'nulls': df.isna().sum()}),
+            use_container_width=True
+        )
+        quality = get_data_quality()
+        if quality:
+            st.caption("Unparseable cells")
+            st.dataframe(pd.DataFrame.from_dict(quality, orient='index'), use_container_width=True)
+        fetch_log = get_fetch_log()
+        if fetch_log:
+            st.caption("Block fetch timings")
+            st.dataframe(pd.DataFrame(list(fetch_log)), use_container_width=True, hide_index=True)
+        st.caption("Aggregation cache")
+        st.json(get_aggregate_cache().stats())
+
 # Main dashboard
 def main():
     st.title("🏦 Performance Dashboard")
     st.markdown("---")
     
     # Load data
-    df = load_data()
+    # Navigation callbacks reset these; a click should cost one view run and
+    # no full run
+    st.session_state.runs_since_navigation += 1
+    
+    loan_book = get_loan_book()
+    dataset = loan_book.get()
     
-    if df is None or df.empty:
+    if dataset is None or dataset.frame.empty:
         st.error("No data loaded. Please check your connection.")
+        if loan_book.last_error is not None:
+            st.error(f"Error loading data: {loan_book.last_error}")
         return
-# Clean numeric columns
-    numeric_columns = ['AMOUNT IN USD', 'OUTSTANDING', 'INTEREST RATE']
-    for col in numeric_columns:
-      if col in df.columns:
-        st.sidebar.info(f"🔄 Cleaning column: {col}")
-        before_sample = df[col].iloc[0] if len(df) > 0 else "N/A"
-        df[col] = clean_numeric_column(df[col])
-        after_sample = df[col].iloc[0] if len(df) > 0 else "N/A"
-        st.sidebar.write(f"   Before: {before_sample} → After: {after_sample}")
-            
-    # Data preprocessing
-    df['MONTH'] = pd.to_datetime(df['Date']).dt.strftime('%B %Y')
-    df['Quarter'] = df['Quarter'].fillna('Unknown')
-    df['Branch/Outlet'] = df['Branch/Outlet'].fillna('Unknown')
-    df['RM Name'] = df['RM Name'].fillna('Unknown')
+    df = dataset.frame
+    st.caption(f"Data as of {dataset.fetched_at.astimezone():%d %b %Y %H:%M}")
+    if get_request_scheduler().is_open:
+        st.warning("Google Sheets is not responding. Showing the last data that loaded successfully.")
+    elif loan_book.last_error is not None:
+        st.warning(f"The last refresh failed ({loan_book.last_error}). Showing the last data that loaded successfully.")
+    
+    if get_setting("debug", False):
+        show_data_debug(df)
     
     # Sidebar filters
     st.sidebar.title("Filters")
     
     # Quarter filter
-    quarters = sorted(df['Quarter'].unique())
+    cube = dataset.cube
+    quarters = observed_categories(cube.cells['Quarter'])
     selected_quarter = st.sidebar.selectbox("Select Quarter", quarters)
     
     # Product type filter
-    product_types = ['All'] + sorted(df['PRODUCT_TYPE'].dropna().unique().tolist())
+    product_types = ['All'] + observed_categories(cube.cells['PRODUCT_TYPE'])
     selected_product = st.sidebar.selectbox("Select Product Type", product_types)
     
-    # Apply filters
-    filtered_df = df[df['Quarter'] == selected_quarter]
-    if selected_product != 'All':
-        filtered_df = filtered_df[filtered_df['PRODUCT_TYPE'] == selected_product]
+    # Filters the views slice the cube with
+    filters = {
+        'quarter': selected_quarter,
+        'product': None if selected_product == 'All' else selected_product
+    }
+    
+    show_current_view(dataset, filters)
+
+@st.fragment
+def show_current_view(dataset, filters):
+    """Navigation bar and the current view
+
+    Clicks in here rerun only this fragment, with the dataset and filters of
+    the last full run. Filters stay outside: fragments can't write to the
+    sidebar, and changing a filter changes every view anyway.
+    """
+    st.session_state.view_runs_since_navigation += 1
     
     # Navigation buttons
     col1, col2, col3 = st.columns(3)
     with col1:
-        if st.button("📅 Monthly Overview", use_container_width=True):
-            st.session_state.current_view = 'monthly'
-            st.session_state.selected_month = None
-            st.session_state.selected_branch = None
+        st.button(
+            "📅 Monthly Overview", use_container_width=True, on_click=navigate,
+            args=('monthly',), kwargs={'selected_month': None, 'selected_branch': None}
+        )
     with col2:
-        if st.button("🏢 Branch Performance", use_container_width=True):
-            if st.session_state.selected_month:
-                st.session_state.current_view = 'branch'
+        st.button(
+            "🏢 Branch Performance", use_container_width=True, on_click=navigate, args=('branch',),
+            disabled=st.session_state.selected_month is None
+        )
     with col3:
-        if st.button("👤 RM Performance", use_container_width=True):
-            if st.session_state.selected_branch:
-                st.session_state.current_view = 'rm'
+        st.button(
+            "👤 RM Performance", use_container_width=True, on_click=navigate, args=('rm',),
+            disabled=not st.session_state.selected_branch
+        )
     
     st.markdown("---")
     
     # View routing
     if st.session_state.current_view == 'monthly':
-        show_monthly_overview(filtered_df)
+        show_monthly_overview(dataset, filters)
     elif st.session_state.current_view == 'branch':
-        show_branch_performance(filtered_df, st.session_state.selected_month)
+        show_branch_performance(dataset, filters, st.session_state.selected_month)
     elif st.session_state.current_view == 'rm':
-        show_rm_performance(filtered_df, st.session_state.selected_branch)
+        show_rm_performance(dataset, filters, st.session_state.selected_branch)
+    
+    if get_setting("debug", False):
+        st.caption(
+            f"Since last navigation: {st.session_state.runs_since_navigation} full runs, "
+            f"{st.session_state.view_runs_since_navigation} view runs"
+        )
+
+def navigate(view, **state):
+    """Widget callback: move to a view and set its drill state
+
+    Callbacks run before the rerun the click starts, so that one run renders
+    the new view; setting state in the script and calling st.rerun() ran
+    everything twice.
+    """
+    st.session_state.current_view = view
+    for name, value in state.items():
+        st.session_state[name] = value
+    st.session_state.runs_since_navigation = 0
+    st.session_state.view_runs_since_navigation = 0
+
+def drill_on_select(key, view, state_key, values):
+    """on_select callback for the table in widget key: drill into the selected row
+
+    It runs before the rerun the selection triggers, so that rerun already
+    renders the next view.
+    """
+    def callback():
+        rows = st.session_state[key].selection.rows
+        if rows:
+            navigate(view, **{state_key: values[rows[0]]})
+    return callback
+
+def chart_labels(event):
+    """Category labels of the points selected on a chart: customdata if set, else x"""
+    return [
+        point['customdata'][0] if point.get('customdata') else point['x']
+        for point in event.selection.points
+    ]
+
+def drill_on_chart(key, view, state_key, values):
+    """on_select callback for the chart in widget key: drill into the clicked point
 
-def show_monthly_overview(df):
+    values maps the point's label to the drill state value.
+    """
+    def callback():
+        labels = chart_labels(st.session_state[key])
+        if labels and labels[0] in values:
+            navigate(view, **{state_key: values[labels[0]]})
+    return callback
+
+def show_monthly_overview(dataset, filters):
     st.header("📅 Monthly Performance Overview")
     
     # KPI Metrics
     col1, col2, col3, col4 = st.columns(4)
     
-    total_loans = len(df)
-    total_amount = df['AMOUNT IN USD'].sum()
-    avg_loan_size = df['AMOUNT IN USD'].mean()
-    unique_branches = df['Branch/Outlet'].nunique()
+    totals = dataset.cube.slice(**filters).totals()
+    total_loans = totals['loans']
+    total_amount = totals['amount']
+    avg_loan_size = totals['avg_amount']
+    unique_branches = totals['branches']
     
     with col1:
         st.metric("Total Loans", f"{total_loans:,}")
@@ -238,14 +1703,7 @@ def show_monthly_overview(df):
         st.metric("Active Branches", unique_branches)
     
     # Monthly trends
-    monthly_data = df.groupby('MONTH').agg({
-        'AMOUNT IN USD': ['sum', 'count'],
-        'OUTSTANDING': 'sum',
-        'RM Name': 'nunique'
-    }).round(2)
-    
-    monthly_data.columns = ['Total Amount', 'Loan Count', 'Total Outstanding', 'Unique RMs']
-    monthly_data = monthly_data.reset_index()
+    monthly_data = view_aggregate('monthly', dataset, filters)
     
     # Create tabs for different charts
     tab1, tab2, tab3 = st.tabs(["Amount Trends", "Loan Count", "Product Analysis"])
@@ -254,24 +1712,30 @@ def show_monthly_overview(df):
         # Amount by month
         fig_amount = px.bar(
             monthly_data, 
-            x='MONTH', 
+            x='Month', 
             y='Total Amount',
             title="Total Loan Amount by Month",
             color='Total Amount',
             color_continuous_scale='viridis'
         )
         fig_amount.update_layout(xaxis_title="Month", yaxis_title="Total Amount (USD)")
-        st.plotly_chart(fig_amount, use_container_width=True)
-        
-        # Make bars clickable
-        if st.button("📊 Click on bars to view branch performance"):
-            st.info("Click on any bar in the chart above to drill down into branch performance for that month")
+        st.plotly_chart(
+            fig_amount,
+            use_container_width=True,
+            key="monthly_chart",
+            on_select=drill_on_chart(
+                "monthly_chart", 'branch', 'selected_month',
+                dict(zip(monthly_data['Month'], monthly_data['MONTH']))
+            ),
+            selection_mode="points"
+        )
+        st.caption("📊 Click a bar to view branch performance for that month")
     
     with tab2:
         # Loan count by month
         fig_count = px.line(
             monthly_data,
-            x='MONTH',
+            x='Month',
             y='Loan Count',
             title="Loan Count by Month",
             markers=True
@@ -281,7 +1745,7 @@ def show_monthly_overview(df):
     
     with tab3:
         # Product type distribution
-        product_data = df.groupby('PRODUCT_TYPE')['AMOUNT IN USD'].sum().reset_index()
+        product_data = view_aggregate('product', dataset, filters)
         fig_product = px.pie(
             product_data,
             values='AMOUNT IN USD',
@@ -292,46 +1756,41 @@ def show_monthly_overview(df):
     
     # Interactive monthly table
     st.subheader("Monthly Summary Table")
-    display_monthly = monthly_data.copy()
+    st.caption("Select a month to view its branches")
+    display_monthly = monthly_data[['Month', 'Total Amount', 'Loan Count', 'Total Outstanding']].copy()
     display_monthly['Total Amount'] = display_monthly['Total Amount'].apply(lambda x: f"${x:,.2f}")
     display_monthly['Total Outstanding'] = display_monthly['Total Outstanding'].apply(lambda x: f"${x:,.2f}")
     
-    # Add clickable functionality
-    for idx, row in display_monthly.iterrows():
-        col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 2, 2])
-        with col1:
-            st.write(f"**{row['MONTH']}**")
-        with col2:
-            st.write(f"Amount: {row['Total Amount']}")
-        with col3:
-            st.write(f"Loans: {row['Loan Count']}")
-        with col4:
-            st.write(f"Outstanding: {row['Total Outstanding']}")
-        with col5:
-            if st.button("View Branches", key=f"month_{idx}"):
-                st.session_state.current_view = 'branch'
-                st.session_state.selected_month = row['MONTH']
-                st.rerun()
-
-def show_branch_performance(df, selected_month):
-    st.header(f"🏢 Branch Performance - {selected_month}")
+    st.dataframe(
+        display_monthly,
+        column_config={"Total Outstanding": "Outstanding"},
+        use_container_width=True,
+        hide_index=True,
+        key="monthly_table",
+        on_select=drill_on_select("monthly_table", 'branch', 'selected_month', monthly_data['MONTH'].tolist()),
+        selection_mode="single-row"
+    )
+
+def show_branch_performance(dataset, filters, selected_month):
+    st.header(f"🏢 Branch Performance - {month_label(selected_month)}")
     
     # Filter data for selected month
-    month_df = df[df['MONTH'] == selected_month]
+    month_cube = dataset.cube.slice(**filters, month=selected_month)
     
     # Back button
-    if st.button("← Back to Monthly Overview"):
-        st.session_state.current_view = 'monthly'
-        st.session_state.selected_month = None
-        st.rerun()
+    st.button(
+        "← Back to Monthly Overview", on_click=navigate, args=('monthly',),
+        kwargs={'selected_month': None}
+    )
     
     # Branch KPIs
     col1, col2, col3, col4 = st.columns(4)
     
-    branch_loans = len(month_df)
-    branch_amount = month_df['AMOUNT IN USD'].sum()
-    branch_outstanding = month_df['OUTSTANDING'].sum()
-    unique_rms = month_df['RM Name'].nunique()
+    totals = month_cube.totals()
+    branch_loans = totals['loans']
+    branch_amount = totals['amount']
+    branch_outstanding = totals['outstanding']
+    unique_rms = totals['rms']
     
     with col1:
         st.metric("Branch Loans", branch_loans)
@@ -343,15 +1802,7 @@ def show_branch_performance(df, selected_month):
         st.metric("Active RMs", unique_rms)
     
     # Branch performance
-    branch_data = month_df.groupby('Branch/Outlet').agg({
-        'AMOUNT IN USD': ['sum', 'count'],
-        'OUTSTANDING': 'sum',
-        'RM Name': 'nunique',
-        'INTEREST RATE': 'mean'
-    }).round(2)
-    
-    branch_data.columns = ['Total Amount', 'Loan Count', 'Total Outstanding', 'RM Count', 'Avg Interest Rate']
-    branch_data = branch_data.reset_index()
+    branch_data = view_aggregate('branch', dataset, filters, month=selected_month)
     
     # Charts
     col1, col2 = st.columns(2)
@@ -361,63 +1812,58 @@ def show_branch_performance(df, selected_month):
             branch_data,
             x='Branch/Outlet',
             y='Total Amount',
-            title=f"Loan Amount by Branch - {selected_month}",
+            title=f"Loan Amount by Branch - {month_label(selected_month)}",
             color='Total Amount'
         )
-        st.plotly_chart(fig_branch_amount, use_container_width=True)
+        branches = branch_data['Branch/Outlet'].tolist()
+        st.plotly_chart(
+            fig_branch_amount,
+            use_container_width=True,
+            key="branch_chart",
+            on_select=drill_on_chart("branch_chart", 'rm', 'selected_branch', dict(zip(branches, branches))),
+            selection_mode="points"
+        )
+        st.caption("Click a bar to view that branch's RMs")
     
     with col2:
         fig_branch_count = px.pie(
             branch_data,
             values='Loan Count',
             names='Branch/Outlet',
-            title=f"Loan Distribution by Branch - {selected_month}"
+            title=f"Loan Distribution by Branch - {month_label(selected_month)}"
         )
         st.plotly_chart(fig_branch_count, use_container_width=True)
     
     # Interactive branch table
     st.subheader("Branch Performance Details")
+    st.caption("Select a branch to view its RMs")
+    display_branch = branch_data[
+        ['Branch/Outlet', 'Total Amount', 'Loan Count', 'Total Outstanding', 'RM Count']
+    ].copy()
+    display_branch['Total Amount'] = display_branch['Total Amount'].apply(lambda x: f"${x:,.2f}")
+    display_branch['Total Outstanding'] = display_branch['Total Outstanding'].apply(lambda x: f"${x:,.2f}")
     
-    for idx, row in branch_data.iterrows():
-        col1, col2, col3, col4, col5, col6 = st.columns([2, 2, 2, 2, 2, 2])
-        with col1:
-            st.write(f"**{row['Branch/Outlet']}**")
-        with col2:
-            st.write(f"Amount: ${row['Total Amount']:,.2f}")
-        with col3:
-            st.write(f"Loans: {row['Loan Count']}")
-        with col4:
-            st.write(f"Outstanding: ${row['Total Outstanding']:,.2f}")
-        with col5:
-            st.write(f"RMs: {row['RM Count']}")
-        with col6:
-            if st.button("View RMs", key=f"branch_{idx}"):
-                st.session_state.current_view = 'rm'
-                st.session_state.selected_branch = row['Branch/Outlet']
-                st.rerun()
-
-def show_rm_performance(df, selected_branch):
+    st.dataframe(
+        display_branch,
+        column_config={"Total Outstanding": "Outstanding", "RM Count": "RMs"},
+        use_container_width=True,
+        hide_index=True,
+        key="branch_table",
+        on_select=drill_on_select("branch_table", 'rm', 'selected_branch', branch_data['Branch/Outlet'].tolist()),
+        selection_mode="single-row"
+    )
+
+def show_rm_performance(dataset, filters, selected_branch):
     st.header(f"👤 RM Performance - {selected_branch}")
     
-    # Filter data for selected branch
-    branch_df = df[df['Branch/Outlet'] == selected_branch]
-    
     # Back button
-    if st.button("← Back to Branch Performance"):
-        st.session_state.current_view = 'branch'
-        st.session_state.selected_branch = None
-        st.rerun()
+    st.button(
+        "← Back to Branch Performance", on_click=navigate, args=('branch',),
+        kwargs={'selected_branch': None}
+    )
     
     # RM performance data
-    rm_data = branch_df.groupby('RM Name').agg({
-        'AMOUNT IN USD': ['sum', 'count', 'mean'],
-        'OUTSTANDING': 'sum',
-        'INTEREST RATE': 'mean',
-        'PRODUCT_TYPE': lambda x: x.mode().iloc[0] if not x.mode().empty else 'N/A'
-    }).round(2)
-    
-    rm_data.columns = ['Total Amount', 'Loan Count', 'Avg Loan Size', 'Total Outstanding', 'Avg Interest Rate', 'Top Product']
-    rm_data = rm_data.reset_index()
+    rm_data = view_aggregate('rm', dataset, filters, branch=selected_branch)
     
     # RM KPIs
     top_rm = rm_data.loc[rm_data['Total Amount'].idxmax()]
@@ -444,7 +1890,9 @@ def show_rm_performance(df, selected_branch):
             color='Total Amount',
             color_continuous_scale='thermal'
         )
-        st.plotly_chart(fig_rm_amount, use_container_width=True)
+        amount_event = st.plotly_chart(
+            fig_rm_amount, use_container_width=True, key="rm_amount_chart", on_select="rerun"
+        )
     
     with col2:
         fig_rm_loans = px.scatter(
@@ -454,15 +1902,22 @@ def show_rm_performance(df, selected_branch):
             size='Total Amount',
             color='RM Name',
             title="RM Performance: Volume vs Size",
-            hover_data=['Top Product']
+            hover_data=['Top Product'],
+            custom_data=['RM Name']
+        )
+        loans_event = st.plotly_chart(
+            fig_rm_loans, use_container_width=True, key="rm_loans_chart", on_select="rerun"
         )
-        st.plotly_chart(fig_rm_loans, use_container_width=True)
     
     # Detailed RM table
     st.subheader("RM Performance Details")
     
-    # Format the data for display
+    # Format the data for display, narrowed to the RMs picked on either chart
     display_rm = rm_data.copy()
+    picked = set(chart_labels(amount_event)) | set(chart_labels(loans_event))
+    if picked:
+        display_rm = display_rm[display_rm['RM Name'].isin(picked)]
+        st.caption(f"Showing {len(picked)} selected RM(s); clear the chart selection to show all")
     display_rm['Total Amount'] = display_rm['Total Amount'].apply(lambda x: f"${x:,.2f}")
     display_rm['Avg Loan Size'] = display_rm['Avg Loan Size'].apply(lambda x: f"${x:,.2f}")
     display_rm['Total Outstanding'] = display_rm['Total Outstanding'].apply(lambda x: f"${x:,.2f}")
@@ -0,0 +1,293 @@
+"""Offline benchmarks for the dashboard's data paths
+
+Run with: python benchmarks.py
+Uses synthetic Sheet2-shaped data, so no Google credentials are needed.
+"""
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+from gspread.utils import fill_gaps, numericise_all, to_records
+
+import CE
+
+ROW_COUNTS = [10_000, 100_000, 500_000]
+DIMENSIONS = ['Quarter', 'Branch/Outlet', 'RM Name', 'PRODUCT_TYPE']
+HEADER = [
+    'LOAN ID', 'Branch/Outlet', 'RM Name', 'PRODUCT_TYPE', 'Quarter', 'Date',
+    'VALUE DATE', 'MATUR_DATE', 'AMOUNT IN USD', 'OUTSTANDING', 'INTEREST RATE',
+    'CUSTOMER NAME'
+]
+
+
+def make_values(rows, seed=0):
+    """Synthetic raw values block shaped like Sheet2 (header row first)"""
+    rng = random.Random(seed)
+    branches = [f"Branch {i:03d}" for i in range(150)]
+    rms = [f"RM {i:04d}" for i in range(600)]
+    products = ['Home Loan', 'Auto Loan', 'SME Loan', 'Personal Loan', 'Agri Loan']
+    values = [HEADER]
+    for i in range(rows):
+        month = rng.randint(1, 12)
+        day = rng.randint(1, 28)
+        amount = rng.uniform(500, 250_000)
+        # Each RM works out of one branch, four RMs to a branch
+        branch = rng.randrange(len(branches))
+        values.append([
+            str(100000 + i),
+            branches[branch],
+            rms[branch * 4 + rng.randrange(4)],
+            rng.choice(products),
+            f"Q{(month - 1) // 3 + 1} 2024",
+            f"{month}/{day}/2024",
+            f"{month}/{day}/2024",
+            f"{month}/{day}/2027",
+            f"${amount:,.2f}",
+            f"${amount * rng.uniform(0.1, 1):,.2f}",
+            f"{rng.uniform(6, 18):.2f}%",
+            f"Customer {i}",
+        ])
+    return values
+
+
+def records_path(values):
+    """The old path: what get_all_records() does, then a DataFrame of dicts"""
+    values = fill_gaps(values)
+    rows = [numericise_all(row, default_blank='') for row in values[1:]]
+    return pd.DataFrame(to_records(values[0], rows))
+
+
+def values_path(values):
+    """The raw values path used by load_data"""
+    return CE.frame_from_values(values)
+
+
+def timed(fn, *args, repeat=3):
+    """Best wall time in seconds over a few runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_ingestion():
+    print("Sheet2 ingestion: get_all_records() vs raw values block")
+    print(f"{'rows':>10} {'records (s)':>12} {'values (s)':>12} {'speedup':>8}")
+    for rows in ROW_COUNTS:
+        values = make_values(rows)
+        old = timed(records_path, values)
+        new = timed(values_path, values)
+        print(f"{rows:>10,} {old:>12.3f} {new:>12.3f} {old / new:>7.1f}x")
+
+
+def bench_sources(rows=100_000):
+    print(f"\nLoanBookSource.load() at {rows:,} rows")
+    values = make_values(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        text = pd.DataFrame(values[1:], columns=values[0])
+        text.to_csv(tmp / "book.csv", index=False)
+        typed, _, _ = CE.MemorySource(values).load()
+        typed.to_parquet(tmp / "book.parquet", index=False)
+        with sqlite3.connect(tmp / "book.db") as conn:
+            typed.to_sql("loans", conn, index=False)
+        sources = [
+            CE.MemorySource(values),
+            CE.CsvSource(tmp / "book.csv"),
+            CE.ParquetSource(tmp / "book.parquet"),
+            CE.SQLiteSource(tmp / "book.db"),
+        ]
+        for source in sources:
+            print(f"{source.name:>10} {timed(source.load):>8.3f}s")
+
+
+def legacy_clean_numeric_column(series):
+    """clean_numeric_column before the Arrow fast path: regex over every cell"""
+    cleaned = series.astype(str).str.replace(r'[^\d.-]', '', regex=True)
+    return pd.to_numeric(cleaned, errors='coerce')
+
+
+def bench_clean(rows=1_000_000):
+    print(f"\nclean_numeric_column at {rows:,} cells")
+    amounts = [f"${i * 1.37:,.2f}" for i in range(rows)]
+    cases = [
+        ('text', pd.Series(amounts, dtype=object)),
+        ('mixed', pd.Series([a if i % 2 else i * 1.37 for i, a in enumerate(amounts)], dtype=object)),
+    ]
+    print(f"{'cells':>10} {'regex (s)':>10} {'arrow (s)':>10} {'speedup':>8}")
+    for name, series in cases:
+        old = timed(legacy_clean_numeric_column, series)
+        new = timed(CE.clean_numeric_column, series)
+        print(f"{name:>10} {old:>10.3f} {new:>10.3f} {old / new:>7.1f}x")
+
+
+def monthly_view(df, quarter):
+    """The filters and aggregations show_monthly_overview runs"""
+    df = df[df['Quarter'] == quarter]
+    df['Branch/Outlet'].nunique()
+    df.groupby('MONTH', observed=True).agg({
+        'AMOUNT IN USD': ['sum', 'count'],
+        'OUTSTANDING': 'sum',
+        'RM Name': 'nunique'
+    })
+    df.groupby('PRODUCT_TYPE', observed=True)['AMOUNT IN USD'].sum()
+
+
+def branch_view(df, quarter, month):
+    """The filters and aggregations show_branch_performance runs"""
+    df = df[df['Quarter'] == quarter]
+    df = df[df['MONTH'] == month]
+    df['RM Name'].nunique()
+    df.groupby('Branch/Outlet', observed=True).agg({
+        'AMOUNT IN USD': ['sum', 'count'],
+        'OUTSTANDING': 'sum',
+        'RM Name': 'nunique',
+        'INTEREST RATE': 'mean'
+    })
+
+
+def rm_view(df, quarter, branch):
+    """The filters and aggregations show_rm_performance runs"""
+    df = df[df['Quarter'] == quarter]
+    df = df[df['Branch/Outlet'] == branch]
+    df.groupby('RM Name', observed=True).agg({
+        'AMOUNT IN USD': ['sum', 'count', 'mean'],
+        'OUTSTANDING': 'sum',
+        'INTEREST RATE': 'mean',
+        'PRODUCT_TYPE': lambda x: x.mode().iloc[0] if not x.mode().empty else 'N/A'
+    })
+
+
+def bench_views(rows=500_000):
+    print(f"\nView filters and groupbys at {rows:,} rows: text vs categorical dimensions")
+    raw, _, _ = CE.MemorySource(make_values(rows)).load()
+    categorical = CE.prepare_data(raw)
+    text = categorical.astype({col: object for col in DIMENSIONS})
+    quarter = 'Q1 2024'
+    month = categorical.loc[categorical['Quarter'] == quarter, 'MONTH'].iloc[0]
+    branch = categorical['Branch/Outlet'].iloc[0]
+    views = [
+        ('monthly', monthly_view, (quarter,)),
+        ('branch', branch_view, (quarter, month)),
+        ('rm', rm_view, (quarter, branch)),
+    ]
+    print(f"{'view':>10} {'text (s)':>10} {'cat (s)':>10} {'speedup':>8}")
+    for name, view, args in views:
+        old = timed(view, text, *args)
+        new = timed(view, categorical, *args)
+        print(f"{name:>10} {old:>10.3f} {new:>10.3f} {old / new:>7.1f}x")
+    old_mb = text[DIMENSIONS].memory_usage(deep=True).sum() / 1e6
+    new_mb = categorical[DIMENSIONS].memory_usage(deep=True).sum() / 1e6
+    print(f"{'memory':>10} {old_mb:>9.1f}M {new_mb:>9.1f}M")
+
+
+def cube_monthly_view(cube, quarter):
+    """show_monthly_overview's numbers rolled up from the cube"""
+    cube = cube.slice(quarter=quarter)
+    cube.totals()
+    cube.rollup('MONTH')
+    cube.rollup('PRODUCT_TYPE')
+
+
+def cube_branch_view(cube, quarter, month):
+    """show_branch_performance's numbers rolled up from the cube"""
+    cube = cube.slice(quarter=quarter, month=month)
+    cube.totals()
+    cube.rollup('Branch/Outlet')
+
+
+def cube_rm_view(cube, quarter, branch):
+    """show_rm_performance's numbers rolled up from the cube"""
+    cube = cube.slice(quarter=quarter, branch=branch)
+    cube.rollup('RM Name')
+    cube.top_products()
+
+
+def bench_cube(rows=500_000):
+    print(f"\nView aggregations at {rows:,} rows: loan rows vs LoanCube cells")
+    raw, _, _ = CE.MemorySource(make_values(rows)).load()
+    df = CE.prepare_data(raw)
+    build = timed(CE.LoanCube.from_frame, df)
+    cube = CE.LoanCube.from_frame(df)
+    print(f"{len(cube.cells):,} cells, built in {build:.3f}s")
+    quarter = 'Q1 2024'
+    month = df.loc[df['Quarter'] == quarter, 'MONTH'].iloc[0]
+    branch = df['Branch/Outlet'].iloc[0]
+    views = [
+        ('monthly', monthly_view, cube_monthly_view, (quarter,)),
+        ('branch', branch_view, cube_branch_view, (quarter, month)),
+        ('rm', rm_view, cube_rm_view, (quarter, branch)),
+    ]
+    print(f"{'view':>10} {'rows (s)':>10} {'cube (s)':>10} {'speedup':>8}")
+    for name, row_view, cube_view, args in views:
+        old = timed(row_view, df, *args)
+        new = timed(cube_view, cube, *args)
+        print(f"{name:>10} {old:>10.3f} {new:>10.3f} {old / new:>7.1f}x")
+
+
+def mask_filter(df, quarter, product, branch):
+    """The row masks the views built before the cube"""
+    df = df[df['Quarter'] == quarter]
+    df = df[df['PRODUCT_TYPE'] == product]
+    return df[df['Branch/Outlet'] == branch]
+
+
+def cold_slice(cells, quarter, product, branch):
+    """Index build, intersection and gather on a cube with nothing cached"""
+    return CE.LoanCube(cells).slice(quarter=quarter, product=product, branch=branch)
+
+
+def indexed_slice(cube, quarter, product, branch):
+    """Intersection and gather for a combination the cube hasn't sliced yet"""
+    cube._slices.clear()
+    return cube.slice(quarter=quarter, product=product, branch=branch)
+
+
+def cached_slice(cube, quarter, product, branch):
+    """A combination the cube has already sliced"""
+    return cube.slice(quarter=quarter, product=product, branch=branch)
+
+
+def bench_filters(rows=500_000):
+    print(f"\nQuarter x product x branch filter at {rows:,} rows")
+    raw, _, _ = CE.MemorySource(make_values(rows)).load()
+    df = CE.prepare_data(raw)
+    cube = CE.LoanCube.from_frame(df)
+    args = ('Q1 2024', 'Home Loan', df['Branch/Outlet'].iloc[0])
+    cases = [
+        ('row masks', mask_filter, df),
+        ('cell masks', mask_filter, cube.cells),
+        ('cold slice', cold_slice, cube.cells),
+        ('indexed', indexed_slice, cube),
+        ('cached', cached_slice, cube),
+    ]
+    for name, fn, data in cases:
+        print(f"{name:>12} {timed(fn, data, *args) * 1000:>8.3f}ms")
+
+
+def bench_cube_delta(rows=500_000, appended=1_000):
+    print(f"\nLoanCube after appending {appended:,} loans to {rows:,}: rebuild vs apply_delta")
+    raw, _, _ = CE.MemorySource(make_values(rows + appended)).load()
+    df = CE.prepare_data(raw)
+    book, delta = df.iloc[:rows], df.iloc[rows:]
+    cube = CE.LoanCube.from_frame(book)
+    rebuild = timed(CE.LoanCube.from_frame, df)
+    # A fresh cube each run, so building its key index is part of the time
+    apply = timed(lambda: CE.LoanCube(cube.cells, cube.cents).apply_delta(delta))
+    print(f"{'rebuild (s)':>12} {'delta (s)':>10} {'speedup':>8}")
+    print(f"{rebuild:>12.3f} {apply:>10.3f} {rebuild / apply:>7.1f}x")
+
+
+if __name__ == "__main__":
+    bench_ingestion()
+    bench_sources()
+    bench_clean()
+    bench_views()
+    bench_cube()
+    bench_filters()
+    bench_cube_delta()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# CE.py and benchmarks.py live at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,84 @@
+"""LoanCube.apply_delta against a full rebuild from the merged frame"""
+import numpy as np
+import pytest
+
+import CE
+from benchmarks import HEADER, make_values
+
+
+@pytest.fixture(params=[False, True], ids=['float', 'cents'])
+def settings(request, monkeypatch):
+    values = {'money_as_cents': request.param, 'loan_id_column': 'LOAN ID'}
+    monkeypatch.setattr(CE, 'get_setting', lambda name, default: values.get(name, default))
+    return values
+
+
+def prepared(rows):
+    raw, _, _ = CE.MemorySource([HEADER] + rows).load()
+    return CE.prepare_data(raw)
+
+
+def assert_same_cells(actual, expected):
+    keys = CE.CUBE_DIMENSIONS
+    actual, expected = (
+        cube.cells.astype({key: object for key in keys})
+        .sort_values(keys, na_position='first').reset_index(drop=True)
+        for cube in (actual, expected)
+    )
+    assert actual.shape == expected.shape
+    for key in keys:
+        assert actual[key].isna().equals(expected[key].isna())
+        assert (actual[key].dropna() == expected[key].dropna()).all()
+    assert np.allclose(
+        actual[CE.CUBE_MEASURES].astype('float64'), expected[CE.CUBE_MEASURES].astype('float64')
+    )
+
+
+@pytest.fixture
+def book(settings):
+    rows = make_values(1500, seed=7)[1:]
+    # Blank products and amounts keep cells of their own
+    for row in rows[::31]:
+        row[3] = ''
+    for row in rows[::47]:
+        row[8] = ''
+    return rows
+
+
+def test_insert_matches_rebuild(book, settings):
+    frame = prepared(book[:1000])
+    merged, inserted, replaced = CE.merge_loans(frame, prepared(book[1000:]), 'LOAN ID')
+    cube = CE.LoanCube.from_frame(frame).apply_delta(inserted, replaced)
+    assert replaced.empty
+    assert cube.cents == settings['money_as_cents']
+    assert_same_cells(cube, CE.LoanCube.from_frame(merged))
+
+
+def test_replace_matches_rebuild(book):
+    frame = prepared(book)
+    updates = [list(row) for row in book[:200]]
+    for row in updates:
+        row[1], row[3], row[8] = 'Branch NEW', 'New Product', '$1.00'
+    merged, inserted, replaced = CE.merge_loans(frame, prepared(updates), 'LOAN ID')
+    cube = CE.LoanCube.from_frame(frame).apply_delta(inserted, replaced)
+    assert len(merged) == len(frame) and len(replaced) == 200
+    assert_same_cells(cube, CE.LoanCube.from_frame(merged))
+    assert 'Branch NEW' in set(cube.cells['Branch/Outlet'])
+
+
+def test_remove_matches_rebuild(book):
+    frame = prepared(book)
+    gone = frame[frame['RM Name'].isin(['RM 0000', 'RM 0001'])]
+    cube = CE.LoanCube.from_frame(frame).apply_delta(removed=gone)
+    assert_same_cells(cube, CE.LoanCube.from_frame(frame.drop(gone.index)))
+    # Removing every loan of an RM drops its cells, and so its distinct count
+    assert not {'RM 0000', 'RM 0001'} & set(cube.cells['RM Name'])
+    branch = gone['Branch/Outlet'].iloc[0]
+    rest = frame.drop(gone.index)
+    expected = rest.loc[rest['Branch/Outlet'] == branch, 'RM Name'].nunique()
+    assert cube.slice(branch=branch).totals()['rms'] == expected
+
+
+def test_empty_delta_keeps_cube(book):
+    cube = CE.LoanCube.from_frame(prepared(book[:100]))
+    assert cube.apply_delta() is cube
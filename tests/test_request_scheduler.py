@@ -0,0 +1,110 @@
+"""SheetsRequestScheduler driven by a stub Sheets endpoint and a fake clock"""
+import pytest
+import requests
+
+import CE
+
+
+class FakeClock:
+    """time.monotonic and time.sleep stand-ins; sleeping moves the clock"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class StubSheets:
+    """Plays back a script of responses and exceptions, counting calls"""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        outcome = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def make_scheduler(clock, **kwargs):
+    return CE.SheetsRequestScheduler(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_retries_429_503_and_connection_errors():
+    clock = FakeClock()
+    stub = StubSheets(
+        Response(429), Response(503), requests.ConnectionError("reset"), Response(200)
+    )
+    response = make_scheduler(clock, base_delay=1.0).request(stub)
+    assert response.status_code == 200
+    assert stub.calls == 4
+    # One backoff per retry, each within its full-jitter cap
+    assert len(clock.sleeps) == 3
+    assert all(0 <= delay <= 2 ** attempt for attempt, delay in enumerate(clock.sleeps))
+
+
+def test_honours_retry_after():
+    clock = FakeClock()
+    stub = StubSheets(Response(429, {'Retry-After': '7'}), Response(200))
+    assert make_scheduler(clock).request(stub).status_code == 200
+    assert clock.sleeps == [7.0]
+
+
+def test_gives_up_after_max_retries():
+    clock = FakeClock()
+    stub = StubSheets(Response(503))
+    response = make_scheduler(clock, max_retries=2).request(stub)
+    # The last error response is handed back for gspread to raise
+    assert response.status_code == 503
+    assert stub.calls == 3
+
+    stub = StubSheets(requests.ConnectionError("down"))
+    with pytest.raises(requests.ConnectionError):
+        make_scheduler(clock, max_retries=2).request(stub)
+    assert stub.calls == 3
+
+
+def test_circuit_opens_and_resets():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, max_retries=0, failure_threshold=2, reset_timeout=60.0)
+    failing = StubSheets(requests.ConnectionError("down"))
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            scheduler.request(failing)
+    assert scheduler.is_open
+
+    # While open, requests are refused without reaching Sheets
+    with pytest.raises(CE.CircuitOpenError):
+        scheduler.request(failing)
+    assert failing.calls == 2
+
+    # After the reset timeout a trial request goes through and closes it
+    clock.now += 60
+    assert not scheduler.is_open
+    assert scheduler.request(StubSheets(Response(200))).status_code == 200
+    assert not scheduler.is_open
+
+
+def test_waits_for_per_minute_quota():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, per_minute=2)
+    ok = StubSheets(Response(200))
+    for _ in range(3):
+        scheduler.request(ok)
+    assert ok.calls == 3
+    assert clock.sleeps == [60.0]